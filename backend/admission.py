@@ -0,0 +1,169 @@
+import asyncio
+import math
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+# Priority classes: (max concurrent requests, max queued requests, max queue wait in seconds).
+# Critical routes (health checks, single-record reads) are not admission controlled
+# at all, so a saturated heavy route can never starve them.
+STANDARD = "standard"
+HEAVY = "heavy"
+
+PRIORITY_CLASSES = {
+    STANDARD: (
+        int(os.getenv("ADMISSION_STANDARD_CONCURRENCY", "16")),
+        int(os.getenv("ADMISSION_STANDARD_QUEUE", "64")),
+        float(os.getenv("ADMISSION_STANDARD_WAIT_SECONDS", "2.0")),
+    ),
+    HEAVY: (
+        int(os.getenv("ADMISSION_HEAVY_CONCURRENCY", "2")),
+        int(os.getenv("ADMISSION_HEAVY_QUEUE", "8")),
+        float(os.getenv("ADMISSION_HEAVY_WAIT_SECONDS", "1.0")),
+    ),
+}
+
+def _available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Class-wide limits shared by every route of a class, on top of the per-route
+# limits. Heavy routes are CPU-bound, so together they may not run more
+# requests than there are cores, however many heavy routes exist.
+CLASS_LIMITS = {
+    HEAVY: (
+        int(os.getenv("ADMISSION_HEAVY_CLASS_CONCURRENCY", str(_available_cores()))),
+        int(os.getenv("ADMISSION_HEAVY_CLASS_QUEUE", "16")),
+        PRIORITY_CLASSES[HEAVY][2],
+    ),
+}
+
+# Weight of the latest request in the moving average of service time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class RouteLimiter:
+    """Concurrency limit with a bounded wait queue for a single route (or a whole class)"""
+
+    def __init__(self, route: str, priority: str, limits: Optional[tuple] = None):
+        self.route = route
+        self.priority = priority
+        self.max_concurrent, self.max_queue, self.max_wait = limits or PRIORITY_CLASSES[priority]
+        # Requests running or queued; counted before any await so that a burst
+        # arriving in one event-loop tick cannot overshoot the queue bound
+        self.in_flight = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.service_time = 0.0
+        self._semaphore = None
+
+    @property
+    def waiting(self) -> int:
+        return self.in_flight - self.active
+
+    def _retry_after(self) -> str:
+        """Rough time until a queued request would get a slot, in whole seconds"""
+        backlog = (self.waiting + 1) / self.max_concurrent
+        return str(max(1, math.ceil(backlog * self.service_time)))
+
+    async def acquire(self) -> float:
+        # Created lazily so the semaphore binds to the serving event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        if self.in_flight >= self.max_concurrent + self.max_queue:
+            self.rejected_queue_full += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests queued for this endpoint",
+                headers={"Retry-After": self._retry_after()},
+            )
+
+        self.in_flight += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.in_flight -= 1
+            self.rejected_timeout += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Endpoint is saturated, try again later",
+                headers={"Retry-After": self._retry_after()},
+            )
+        except BaseException:
+            # Client went away while queued
+            self.in_flight -= 1
+            raise
+
+        self.active += 1
+        self.admitted += 1
+        return time.perf_counter()
+
+    def release(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self.service_time += SERVICE_TIME_SMOOTHING * (elapsed - self.service_time)
+        self.active -= 1
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "route": self.route,
+            "priority": self.priority,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_service_seconds": round(self.service_time, 4),
+        }
+
+
+_limiters: dict[str, RouteLimiter] = {}
+
+_class_limiters: dict[str, RouteLimiter] = {
+    priority: RouteLimiter(f"all {priority} routes", priority, limits)
+    for priority, limits in CLASS_LIMITS.items()
+}
+
+
+def limit(route: str, priority: str = STANDARD):
+    """
+    Build a route dependency that enforces the concurrency limit of the given
+    priority class, both for this route and, where CLASS_LIMITS has an entry,
+    across every route of the class. Requests beyond a limit wait in a bounded
+    queue; a full queue answers 429 and a wait longer than the class budget
+    answers 503, both with a Retry-After header.
+    """
+    limiter = _limiters.setdefault(route, RouteLimiter(route, priority))
+    class_limiter = _class_limiters.get(priority)
+
+    async def admission_dependency():
+        started = await limiter.acquire()
+        try:
+            if class_limiter is None:
+                yield
+                return
+            class_started = await class_limiter.acquire()
+            try:
+                yield
+            finally:
+                class_limiter.release(class_started)
+        finally:
+            limiter.release(started)
+
+    return admission_dependency
+
+
+def get_admission_stats() -> list[dict]:
+    """Current queue depth and rejection counters for every limited route"""
+    limiters = list(_class_limiters.values()) + list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
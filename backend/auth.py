@@ -0,0 +1,48 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Header, HTTPException
+from jose import JWTError, jwt
+
+from database import DEFAULT_ACCOUNT_ID
+
+# Single-tenant deployments keep every row in the default account and need no
+# credentials. Multi-tenant deployments set SINGLE_TENANT=false and SECRET_KEY;
+# the account is then taken from the "sub" claim of a bearer JWT signed with it.
+SINGLE_TENANT = os.getenv("SINGLE_TENANT", "true").lower() in ("1", "true", "yes")
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+if not SINGLE_TENANT and not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY must be set when SINGLE_TENANT is disabled")
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def create_access_token(account_id: str, expires_delta: Optional[timedelta] = None) -> str:
+    """Issue a signed token that identifies the given account"""
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return jwt.encode({"sub": account_id, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def get_account_id(authorization: Optional[str] = Header(None)) -> str:
+    """Resolve the caller's account from its bearer token"""
+    if SINGLE_TENANT:
+        return DEFAULT_ACCOUNT_ID
+
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise _unauthorized("Not authenticated")
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _unauthorized("Invalid or expired token")
+
+    account_id = payload.get("sub")
+    if not isinstance(account_id, str) or not account_id:
+        raise _unauthorized("Token does not identify an account")
+    return account_id
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before any test imports it, so tests
+# never touch financial_dashboard.db
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.pop("DATABASE_SHARDS", None)
+os.environ["SINGLE_TENANT"] = "true"
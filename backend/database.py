@@ -1,25 +1,195 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, inspect, select, text, union
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
+import zlib
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./financial_dashboard.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
-)
+# Optional sharding: a comma-separated list of extra database URLs. DATABASE_URL
+# is always shard 0 and holds the account directory. A URL may end in "#schema"
+# to place its shard in a separate Postgres schema, e.g.
+# DATABASE_SHARDS=postgresql://host/db#shard_1,postgresql://host/db#shard_2
+# Shards may only be appended: existing accounts stay where the directory says.
+DATABASE_SHARDS = [url.strip() for url in os.getenv("DATABASE_SHARDS", "").split(",") if url.strip()]
+
+DEFAULT_ACCOUNT_ID = "default"
+
+def _create_engine(url: str):
+    return create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {}
+    )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
 
 Base = declarative_base()
 
-def get_database():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Account directory, stored in shard 0. shard_registry records which database each
+# shard index referred to when accounts were assigned to it.
+directory_metadata = MetaData()
+
+shard_registry = Table(
+    "shard_registry", directory_metadata,
+    Column("shard", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+)
+
+account_directory = Table(
+    "account_directory", directory_metadata,
+    Column("account_id", String, primary_key=True),
+    Column("shard", Integer, nullable=False),
+)
+
+class Shard:
+    """One physical database (or Postgres schema) holding a subset of accounts"""
+
+    def __init__(self, url: str, base_engine=None):
+        url, _, schema = url.partition("#")
+        self.schema = schema or None
+        self.name = make_url(url).render_as_string(hide_password=True) + (f"#{schema}" if schema else "")
+        self.base_engine = base_engine or _create_engine(url)
+        self.engine = self.base_engine
+        if self.schema:
+            self.engine = self.base_engine.execution_options(schema_translate_map={None: self.schema})
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+    def create_all(self, metadata):
+        if self.schema:
+            with self.base_engine.begin() as conn:
+                conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"'))
+        metadata.create_all(bind=self.engine)
+        _add_missing_account_columns(self.engine, metadata, self.schema)
+
+def _add_missing_account_columns(engine, metadata, schema=None):
+    """
+    Upgrade tables created before account partitioning: add the account_id
+    column (existing rows belong to the default account) and its indexes.
+    """
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if "account_id" not in table.c:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name, schema=schema)}
+        if "account_id" in columns:
+            continue
+        name = f'"{schema}".{table.name}' if schema else table.name
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE {name} ADD COLUMN account_id VARCHAR NOT NULL "
+                f"DEFAULT '{DEFAULT_ACCOUNT_ID}'"
+            ))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+class AccountRouter:
+    """
+    Routes each account to a shard through the account directory. New
+    accounts are placed by a hash of their id and the placement is stored,
+    so adding shards never moves existing accounts. Without DATABASE_SHARDS
+    every account lives in the DATABASE_URL database.
+    """
+
+    def __init__(self, shard_urls=None, primary_url=None):
+        primary = Shard(primary_url) if primary_url else Shard(SQLALCHEMY_DATABASE_URL, base_engine=engine)
+        self.shards = [primary]
+        self.shards += [Shard(url) for url in shard_urls or []]
+        self._directory = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory_engine(self):
+        return self.shards[0].engine
+
+    def shard_for(self, account_id: str) -> Shard:
+        if len(self.shards) == 1:
+            return self.shards[0]
+        index = self._directory.get(account_id)
+        if index is None:
+            index = self._assign(account_id)
+        return self.shards[index]
+
+    def _assign(self, account_id: str) -> int:
+        index = zlib.crc32(account_id.encode()) % len(self.shards)
+        with self._lock:
+            try:
+                with self.directory_engine.begin() as conn:
+                    conn.execute(account_directory.insert().values(account_id=account_id, shard=index))
+            except IntegrityError:
+                # Another process placed the account first
+                with self.directory_engine.connect() as conn:
+                    index = conn.execute(
+                        select(account_directory.c.shard).where(account_directory.c.account_id == account_id)
+                    ).scalar_one()
+            self._directory[account_id] = index
+        return index
+
+    def session_for(self, account_id: str):
+        return self.shard_for(account_id).SessionLocal()
+
+    def create_all(self, metadata):
+        """
+        Create tables on every shard, then check the configured shards
+        against the registry and register accounts already holding data.
+        Raises RuntimeError when DATABASE_SHARDS no longer matches the
+        shards accounts were assigned to.
+        """
+        directory_metadata.create_all(bind=self.directory_engine)
+        self._check_registry()
+        for shard in self.shards:
+            shard.create_all(metadata)
+        self._register_existing_accounts(metadata)
+
+    def _check_registry(self):
+        with self.directory_engine.begin() as conn:
+            registered = dict(conn.execute(select(shard_registry.c.shard, shard_registry.c.name)).all())
+            for index, name in registered.items():
+                if index >= len(self.shards) or self.shards[index].name != name:
+                    configured = self.shards[index].name if index < len(self.shards) else "nothing"
+                    raise RuntimeError(
+                        f"Shard {index} was registered as {name} but is now configured as {configured}. "
+                        "Shards may only be appended to DATABASE_SHARDS; move the accounts on a shard "
+                        "and update account_directory before removing or reordering it."
+                    )
+            for index, shard in enumerate(self.shards):
+                if index not in registered:
+                    conn.execute(shard_registry.insert().values(shard=index, name=shard.name))
+
+    def _register_existing_accounts(self, metadata):
+        """
+        Register accounts found in shard data but missing from the directory,
+        e.g. data written before sharding was enabled. Refuses to start if an
+        account's rows are on a shard other than the one the directory names.
+        """
+        partitioned = [table for table in metadata.sorted_tables if "account_id" in table.c]
+        if not partitioned:
+            return
+        accounts = union(*(select(table.c.account_id) for table in partitioned))
+
+        with self.directory_engine.connect() as conn:
+            directory = dict(conn.execute(select(account_directory.c.account_id, account_directory.c.shard)).all())
+
+        for index, shard in enumerate(self.shards):
+            with shard.engine.connect() as conn:
+                found = conn.execute(accounts).scalars().all()
+            for account_id in found:
+                if account_id not in directory:
+                    directory[account_id] = index
+                    with self.directory_engine.begin() as conn:
+                        conn.execute(account_directory.insert().values(account_id=account_id, shard=index))
+                elif directory[account_id] != index:
+                    raise RuntimeError(
+                        f"Account {account_id} has rows on shard {index} but the directory places it "
+                        f"on shard {directory[account_id]}; finish or roll back its migration first."
+                    )
+
+        self._directory = directory
+
+# Sessions are only handed out per account, through router.session_for
+router = AccountRouter(DATABASE_SHARDS)
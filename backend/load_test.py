@@ -0,0 +1,180 @@
+"""
+Load test for admission control.
+
+Measures latency of cheap routes on their own, then again while heavy routes
+are hammered past their concurrency limits. With admission control the cheap
+routes' tail latency should stay flat while heavy routes shed load with 429/503.
+
+Usage (against a running server):
+    python load_test.py --url http://localhost:8000 --seed-transactions 200000
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+HEAVY_ROUTES = ["/api/metrics", "/api/dashboard"]
+
+# Sent with every request; holds the bearer token when the server is multi-tenant
+HEADERS = {}
+
+
+def seed_transactions(count: int):
+    """
+    Bulk insert synthetic transactions so heavy routes have a real table to
+    scan, plus a goal so single-record reads have something to find
+    """
+    from database import DEFAULT_ACCOUNT_ID, router
+    from main import Base, FinancialGoal, GoalCategory, Priority, Transaction, TransactionType
+
+    router.create_all(Base.metadata)
+    db = router.session_for(DEFAULT_ACCOUNT_ID)
+    try:
+        now = datetime.utcnow()
+        types = list(TransactionType)
+        db.bulk_insert_mappings(Transaction, [
+            {
+                "account_id": DEFAULT_ACCOUNT_ID,
+                "description": f"Load test transaction {i}",
+                "amount": round(random.uniform(-500, 3000), 2),
+                "date": now - timedelta(days=random.randint(0, 730)),
+                "category": "Load Test",
+                "type": random.choice(types),
+            }
+            for i in range(count)
+        ])
+        db.add(FinancialGoal(
+            account_id=DEFAULT_ACCOUNT_ID,
+            title="Load test goal",
+            target_amount=10000,
+            deadline=now + timedelta(days=365),
+            category=GoalCategory.savings,
+            priority=Priority.low,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+# Status recorded for requests that failed without an HTTP response
+# (connection refused or reset, socket timeout)
+CONNECTION_ERROR = 0
+
+
+def request(url: str) -> tuple[int, float, str]:
+    """Return (status, elapsed seconds, Retry-After header or "")"""
+    started = time.perf_counter()
+    retry_after = ""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=HEADERS), timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+        retry_after = e.headers.get("Retry-After", "")
+    except OSError:
+        # URLError, ConnectionResetError and socket timeouts are all OSErrors
+        status = CONNECTION_ERROR
+    return status, time.perf_counter() - started, retry_after
+
+
+def fetch_json(url: str):
+    with urllib.request.urlopen(urllib.request.Request(url, headers=HEADERS), timeout=30) as response:
+        return json.load(response)
+
+
+def resolve_cheap_routes(base_url: str) -> list[str]:
+    """Single-record reads of a goal and a transaction that actually exist"""
+    goals = fetch_json(base_url + "/api/goals?limit=1")
+    transactions = fetch_json(base_url + "/api/transactions?limit=1")
+    if not goals or not transactions:
+        raise SystemExit("No goal or transaction to read; run with --seed-transactions or seed_data.py first")
+    return ["/api/health", f"/api/goals/{goals[0]['id']}", f"/api/transactions/{transactions[0]['id']}"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def measure_cheap_routes(base_url: str, routes: list[str], count: int) -> tuple[list[float], Counter]:
+    latencies = []
+    statuses = Counter()
+    for i in range(count):
+        status, elapsed, _ = request(base_url + routes[i % len(routes)])
+        latencies.append(elapsed)
+        statuses[status] += 1
+    return latencies, statuses
+
+
+def hammer_heavy_routes(base_url: str, workers: int, stop: threading.Event, statuses: Counter):
+    def worker(i: int):
+        while not stop.is_set():
+            status, _, retry_after = request(base_url + HEAVY_ROUTES[i % len(HEAVY_ROUTES)])
+            statuses[status] += 1
+            # Well-behaved clients back off when shed; capped to keep the pressure on
+            if retry_after:
+                stop.wait(min(1.0, float(retry_after)))
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(worker, i) for i in range(workers)]
+    return executor, futures
+
+
+def format_statuses(statuses: Counter) -> dict:
+    return {"error" if status == CONNECTION_ERROR else status: count for status, count in statuses.items()}
+
+
+def report(label: str, latencies: list[float], statuses: Counter):
+    print(f"{label:<28} p50={percentile(latencies, 50) * 1000:7.1f}ms "
+          f"p95={percentile(latencies, 95) * 1000:7.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:7.1f}ms "
+          f"statuses={format_statuses(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=300, help="cheap requests per phase")
+    parser.add_argument("--heavy-workers", type=int, default=32, help="concurrent heavy clients")
+    parser.add_argument("--seed-transactions", type=int, default=0,
+                        help="insert this many synthetic transactions first (server must share the database)")
+    parser.add_argument("--token", help="bearer token for the default account on multi-tenant servers (see auth.create_access_token)")
+    args = parser.parse_args()
+
+    if args.token:
+        HEADERS["Authorization"] = f"Bearer {args.token}"
+
+    if args.seed_transactions:
+        seed_transactions(args.seed_transactions)
+
+    cheap_routes = resolve_cheap_routes(args.url)
+    report("cheap routes, idle", *measure_cheap_routes(args.url, cheap_routes, args.requests))
+
+    stop = threading.Event()
+    statuses = Counter()
+    executor, futures = hammer_heavy_routes(args.url, args.heavy_workers, stop, statuses)
+    time.sleep(1)
+    try:
+        report("cheap routes, heavy load", *measure_cheap_routes(args.url, cheap_routes, args.requests))
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+    # A worker that died would silently lower the load; make it loud instead
+    for future in futures:
+        if future.exception():
+            raise SystemExit(f"heavy load worker failed: {future.exception()!r}")
+
+    print(f"heavy route statuses: {format_statuses(statuses)}")
+    print(json.dumps(fetch_json(args.url + "/api/admission"), indent=2))
+
+
+if __name__ == "__main__":
+    main()
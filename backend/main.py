@@ -1,13 +1,20 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Enum as SQLEnum
+from sqlalchemy import extract, func, Column, Index, Integer, String, Float, DateTime, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
+import asyncio
 import enum
 
+import admission
+from auth import get_account_id
+from database import DEFAULT_ACCOUNT_ID, router
+import simulation
+
 app = FastAPI(title="Financial Strategy & Achievements API", version="1.0.0")
 
 # CORS middleware
@@ -19,10 +26,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./financial_dashboard.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Database setup (engines and account sharding live in database.py)
 Base = declarative_base()
 
 # Enums
@@ -50,8 +54,12 @@ class Status(str, enum.Enum):
 # Database Models
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_account_id_date_id", "account_id", "date", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(String, nullable=False, default=DEFAULT_ACCOUNT_ID)
     description = Column(String, index=True)
     amount = Column(Float)
     date = Column(DateTime, default=datetime.utcnow)
@@ -60,8 +68,12 @@ class Transaction(Base):
 
 class FinancialGoal(Base):
     __tablename__ = "financial_goals"
+    __table_args__ = (
+        Index("ix_financial_goals_account_id_created_at_id", "account_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(String, nullable=False, default=DEFAULT_ACCOUNT_ID)
     title = Column(String, index=True)
     target_amount = Column(Float)
     current_amount = Column(Float, default=0)
@@ -73,8 +85,12 @@ class FinancialGoal(Base):
 
 class Achievement(Base):
     __tablename__ = "achievements"
+    __table_args__ = (
+        Index("ix_achievements_account_id_date_achieved_id", "account_id", "date_achieved", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(String, nullable=False, default=DEFAULT_ACCOUNT_ID)
     title = Column(String, index=True)
     description = Column(String)
     date_achieved = Column(DateTime, default=datetime.utcnow)
@@ -157,16 +173,48 @@ class FinancialMetrics(BaseModel):
     investment_returns: float
     debt_to_income_ratio: float
 
+class GoalSimulationResponse(BaseModel):
+    goal_id: int
+    paths: int
+    seed: int
+    months: int
+    start: float
+    target: float
+    contribution_mean: float
+    contribution_std: float
+    annual_return: float
+    annual_volatility: float
+    attainment_probability: float
+    expected_balance: float
+    percentiles: Dict[str, float]
+
+class BulkGoalSimulationRequest(BaseModel):
+    goal_ids: Optional[List[int]] = None
+    paths: int = Field(simulation.DEFAULT_PATHS, ge=1, le=simulation.MAX_PATHS)
+    seed: int = Field(0, ge=0)
+
+# Every route and aggregate is scoped to the caller's account (see auth.get_account_id)
+def account_query(db: Session, model, account_id: str):
+    return db.query(model).filter(model.account_id == account_id)
+
 # Database dependency
-def get_db():
-    db = SessionLocal()
+def get_db(account_id: str = Depends(get_account_id)):
+    db = router.session_for(account_id)
     try:
         yield db
     finally:
         db.close()
 
 # Create tables
-Base.metadata.create_all(bind=engine)
+router.create_all(Base.metadata)
+
+@app.on_event("startup")
+async def start_simulation_pool():
+    await asyncio.get_running_loop().run_in_executor(None, simulation.warm_up_executor)
+
+@app.on_event("shutdown")
+async def stop_simulation_pool():
+    simulation.shutdown_executor()
 
 # Routes
 @app.get("/")
@@ -177,10 +225,16 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.get("/api/admission")
+async def get_admission_stats():
+    """Queue depth and rejection counters for admission-controlled routes"""
+    return admission.get_admission_stats()
+
 # Transaction endpoints
-@app.post("/api/transactions", response_model=TransactionResponse)
-async def create_transaction(transaction: TransactionCreate, db: Session = Depends(get_db)):
+@app.post("/api/transactions", response_model=TransactionResponse, dependencies=[Depends(admission.limit("POST /api/transactions"))])
+async def create_transaction(transaction: TransactionCreate, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
     db_transaction = Transaction(
+        account_id=account_id,
         description=transaction.description,
         amount=transaction.amount,
         category=transaction.category,
@@ -192,21 +246,21 @@ async def create_transaction(transaction: TransactionCreate, db: Session = Depen
     db.refresh(db_transaction)
     return db_transaction
 
-@app.get("/api/transactions", response_model=List[TransactionResponse])
-async def get_transactions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    transactions = db.query(Transaction).order_by(Transaction.date.desc()).offset(skip).limit(limit).all()
+@app.get("/api/transactions", response_model=List[TransactionResponse], dependencies=[Depends(admission.limit("GET /api/transactions"))])
+async def get_transactions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    transactions = account_query(db, Transaction, account_id).order_by(Transaction.date.desc()).offset(skip).limit(limit).all()
     return transactions
 
 @app.get("/api/transactions/{transaction_id}", response_model=TransactionResponse)
-async def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+async def get_transaction(transaction_id: int, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    transaction = account_query(db, Transaction, account_id).filter(Transaction.id == transaction_id).first()
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     return transaction
 
-@app.delete("/api/transactions/{transaction_id}")
-async def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+@app.delete("/api/transactions/{transaction_id}", dependencies=[Depends(admission.limit("DELETE /api/transactions/{transaction_id}"))])
+async def delete_transaction(transaction_id: int, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    transaction = account_query(db, Transaction, account_id).filter(Transaction.id == transaction_id).first()
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     db.delete(transaction)
@@ -214,9 +268,10 @@ async def delete_transaction(transaction_id: int, db: Session = Depends(get_db))
     return {"message": "Transaction deleted successfully"}
 
 # Financial Goals endpoints
-@app.post("/api/goals", response_model=FinancialGoalResponse)
-async def create_goal(goal: FinancialGoalCreate, db: Session = Depends(get_db)):
+@app.post("/api/goals", response_model=FinancialGoalResponse, dependencies=[Depends(admission.limit("POST /api/goals"))])
+async def create_goal(goal: FinancialGoalCreate, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
     db_goal = FinancialGoal(
+        account_id=account_id,
         title=goal.title,
         target_amount=goal.target_amount,
         current_amount=goal.current_amount,
@@ -229,21 +284,21 @@ async def create_goal(goal: FinancialGoalCreate, db: Session = Depends(get_db)):
     db.refresh(db_goal)
     return db_goal
 
-@app.get("/api/goals", response_model=List[FinancialGoalResponse])
-async def get_goals(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    goals = db.query(FinancialGoal).offset(skip).limit(limit).all()
+@app.get("/api/goals", response_model=List[FinancialGoalResponse], dependencies=[Depends(admission.limit("GET /api/goals"))])
+async def get_goals(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    goals = account_query(db, FinancialGoal, account_id).offset(skip).limit(limit).all()
     return goals
 
 @app.get("/api/goals/{goal_id}", response_model=FinancialGoalResponse)
-async def get_goal(goal_id: int, db: Session = Depends(get_db)):
-    goal = db.query(FinancialGoal).filter(FinancialGoal.id == goal_id).first()
+async def get_goal(goal_id: int, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    goal = account_query(db, FinancialGoal, account_id).filter(FinancialGoal.id == goal_id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     return goal
 
-@app.put("/api/goals/{goal_id}", response_model=FinancialGoalResponse)
-async def update_goal(goal_id: int, goal_update: FinancialGoalUpdate, db: Session = Depends(get_db)):
-    goal = db.query(FinancialGoal).filter(FinancialGoal.id == goal_id).first()
+@app.put("/api/goals/{goal_id}", response_model=FinancialGoalResponse, dependencies=[Depends(admission.limit("PUT /api/goals/{goal_id}"))])
+async def update_goal(goal_id: int, goal_update: FinancialGoalUpdate, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    goal = account_query(db, FinancialGoal, account_id).filter(FinancialGoal.id == goal_id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     
@@ -255,19 +310,91 @@ async def update_goal(goal_id: int, goal_update: FinancialGoalUpdate, db: Sessio
     db.refresh(goal)
     return goal
 
-@app.delete("/api/goals/{goal_id}")
-async def delete_goal(goal_id: int, db: Session = Depends(get_db)):
-    goal = db.query(FinancialGoal).filter(FinancialGoal.id == goal_id).first()
+@app.delete("/api/goals/{goal_id}", dependencies=[Depends(admission.limit("DELETE /api/goals/{goal_id}"))])
+async def delete_goal(goal_id: int, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    goal = account_query(db, FinancialGoal, account_id).filter(FinancialGoal.id == goal_id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     db.delete(goal)
     db.commit()
     return {"message": "Goal deleted successfully"}
 
+# Goal simulation endpoints
+def load_goal_scenarios(db: Session, account_id: str, goal_ids: Optional[List[int]] = None,
+                        allocation: Optional[float] = None, annual_return: Optional[float] = None,
+                        annual_volatility: Optional[float] = None) -> List[dict]:
+    """Build simulation inputs for the given goals, or all active goals when goal_ids is None"""
+    query = account_query(db, FinancialGoal, account_id)
+    if goal_ids is None:
+        goals = query.filter(FinancialGoal.status == Status.active).order_by(FinancialGoal.id).all()
+    else:
+        found = {goal.id: goal for goal in query.filter(FinancialGoal.id.in_(goal_ids))}
+        missing = set(goal_ids) - found.keys()
+        if len(goal_ids) == 1 and missing:
+            raise HTTPException(status_code=404, detail="Goal not found")
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Goals not found: {sorted(missing)}")
+        # Results come back in request order, each goal once
+        goals = [found[goal_id] for goal_id in dict.fromkeys(goal_ids)]
+
+    # Monthly income and expense totals are aggregated in the database
+    year = extract("year", Transaction.date)
+    month = extract("month", Transaction.date)
+    monthly_totals = account_query(db, Transaction, account_id).with_entities(
+        year, month, Transaction.type, func.sum(func.abs(Transaction.amount))
+    ).group_by(year, month, Transaction.type).all()
+    contribution_mean, contribution_std = simulation.estimate_contribution_parameters(
+        (y, m, getattr(type_, "value", type_), total) for y, m, type_, total in monthly_totals
+    )
+
+    # By default the monthly surplus is split evenly across active goals
+    if allocation is None:
+        active_goals = account_query(db, FinancialGoal, account_id).filter(FinancialGoal.status == Status.active).count()
+        allocation = 1 / max(1, active_goals)
+
+    return [
+        simulation.build_goal_scenario(goal, contribution_mean, contribution_std, allocation,
+                                       annual_return, annual_volatility)
+        for goal in goals
+    ]
+
+async def run_goal_simulations(scenarios: List[dict], paths: int, seed: int):
+    try:
+        return await simulation.simulate_goals(scenarios, paths, seed)
+    except simulation.SimulationTooLarge as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (asyncio.TimeoutError, TimeoutError):
+        raise HTTPException(status_code=503, detail="Simulation exceeded its latency budget")
+
+@app.post("/api/goals/simulate", response_model=List[GoalSimulationResponse], dependencies=[Depends(admission.limit("POST /api/goals/simulate", admission.HEAVY))])
+async def simulate_goals(request: BulkGoalSimulationRequest, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    """Run Monte Carlo attainment simulations for several goals at once"""
+    # Database work runs in the threadpool so it never blocks the event loop
+    scenarios = await run_in_threadpool(load_goal_scenarios, db, account_id, request.goal_ids)
+    return await run_goal_simulations(scenarios, request.paths, request.seed)
+
+@app.get("/api/goals/{goal_id}/simulate", response_model=GoalSimulationResponse, dependencies=[Depends(admission.limit("GET /api/goals/{goal_id}/simulate", admission.HEAVY))])
+async def simulate_goal(
+    goal_id: int,
+    paths: int = Query(simulation.DEFAULT_PATHS, ge=1, le=simulation.MAX_PATHS),
+    seed: int = Query(0, ge=0),
+    allocation: Optional[float] = Query(None, gt=0, le=1),
+    annual_return: Optional[float] = Query(None, gt=-1, le=simulation.MAX_ANNUAL_RETURN),
+    annual_volatility: Optional[float] = Query(None, ge=0, le=simulation.MAX_ANNUAL_VOLATILITY),
+    db: Session = Depends(get_db),
+    account_id: str = Depends(get_account_id)
+):
+    """Estimate the probability of reaching a goal by its deadline"""
+    scenarios = await run_in_threadpool(load_goal_scenarios, db, account_id, [goal_id],
+                                        allocation, annual_return, annual_volatility)
+    results = await run_goal_simulations(scenarios, paths, seed)
+    return results[0]
+
 # Achievement endpoints
-@app.post("/api/achievements", response_model=AchievementResponse)
-async def create_achievement(achievement: AchievementCreate, db: Session = Depends(get_db)):
+@app.post("/api/achievements", response_model=AchievementResponse, dependencies=[Depends(admission.limit("POST /api/achievements"))])
+async def create_achievement(achievement: AchievementCreate, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
     db_achievement = Achievement(
+        account_id=account_id,
         title=achievement.title,
         description=achievement.description,
         category=achievement.category,
@@ -279,21 +406,21 @@ async def create_achievement(achievement: AchievementCreate, db: Session = Depen
     db.refresh(db_achievement)
     return db_achievement
 
-@app.get("/api/achievements", response_model=List[AchievementResponse])
-async def get_achievements(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    achievements = db.query(Achievement).order_by(Achievement.date_achieved.desc()).offset(skip).limit(limit).all()
+@app.get("/api/achievements", response_model=List[AchievementResponse], dependencies=[Depends(admission.limit("GET /api/achievements"))])
+async def get_achievements(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    achievements = account_query(db, Achievement, account_id).order_by(Achievement.date_achieved.desc()).offset(skip).limit(limit).all()
     return achievements
 
 @app.get("/api/achievements/{achievement_id}", response_model=AchievementResponse)
-async def get_achievement(achievement_id: int, db: Session = Depends(get_db)):
-    achievement = db.query(Achievement).filter(Achievement.id == achievement_id).first()
+async def get_achievement(achievement_id: int, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    achievement = account_query(db, Achievement, account_id).filter(Achievement.id == achievement_id).first()
     if not achievement:
         raise HTTPException(status_code=404, detail="Achievement not found")
     return achievement
 
-@app.delete("/api/achievements/{achievement_id}")
-async def delete_achievement(achievement_id: int, db: Session = Depends(get_db)):
-    achievement = db.query(Achievement).filter(Achievement.id == achievement_id).first()
+@app.delete("/api/achievements/{achievement_id}", dependencies=[Depends(admission.limit("DELETE /api/achievements/{achievement_id}"))])
+async def delete_achievement(achievement_id: int, db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    achievement = account_query(db, Achievement, account_id).filter(Achievement.id == achievement_id).first()
     if not achievement:
         raise HTTPException(status_code=404, detail="Achievement not found")
     db.delete(achievement)
@@ -301,19 +428,29 @@ async def delete_achievement(achievement_id: int, db: Session = Depends(get_db))
     return {"message": "Achievement deleted successfully"}
 
 # Analytics endpoints
-@app.get("/api/metrics", response_model=FinancialMetrics)
-async def get_financial_metrics(db: Session = Depends(get_db)):
-    # Get all transactions
-    transactions = db.query(Transaction).all()
+# Heavy analytics routes are plain functions so FastAPI runs them in its
+# threadpool instead of blocking the event loop for cheap requests
+@app.get("/api/metrics", response_model=FinancialMetrics, dependencies=[Depends(admission.limit("GET /api/metrics", admission.HEAVY))])
+def get_financial_metrics(db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
+    # Aggregate per transaction type in the database instead of loading every row
+    totals = {
+        type_: (total or 0, abs_total or 0, count)
+        for type_, total, abs_total, count in db.query(
+            Transaction.type,
+            func.sum(Transaction.amount),
+            func.sum(func.abs(Transaction.amount)),
+            func.count(Transaction.id)
+        ).filter(Transaction.account_id == account_id).group_by(Transaction.type)
+    }
     
     # Calculate metrics
-    total_income = sum(t.amount for t in transactions if t.type == TransactionType.income)
-    total_expenses = sum(abs(t.amount) for t in transactions if t.type == TransactionType.expense)
-    total_investments = sum(abs(t.amount) for t in transactions if t.type == TransactionType.investment)
+    total_income, _, income_count = totals.get(TransactionType.income, (0, 0, 0))
+    _, total_expenses, expense_count = totals.get(TransactionType.expense, (0, 0, 0))
+    _, total_investments, _ = totals.get(TransactionType.investment, (0, 0, 0))
     
     # Monthly averages (assuming we have at least some data)
-    monthly_income = total_income / max(1, len([t for t in transactions if t.type == TransactionType.income]))
-    monthly_expenses = total_expenses / max(1, len([t for t in transactions if t.type == TransactionType.expense]))
+    monthly_income = total_income / max(1, income_count)
+    monthly_expenses = total_expenses / max(1, expense_count)
     
     # Calculate ratios
     savings_rate = ((monthly_income - monthly_expenses) / monthly_income * 100) if monthly_income > 0 else 0
@@ -330,15 +467,15 @@ async def get_financial_metrics(db: Session = Depends(get_db)):
         debt_to_income_ratio=debt_to_income_ratio
     )
 
-@app.get("/api/dashboard")
-async def get_dashboard_data(db: Session = Depends(get_db)):
+@app.get("/api/dashboard", dependencies=[Depends(admission.limit("GET /api/dashboard", admission.HEAVY))])
+def get_dashboard_data(db: Session = Depends(get_db), account_id: str = Depends(get_account_id)):
     """Get all dashboard data in one request"""
-    transactions = db.query(Transaction).order_by(Transaction.date.desc()).limit(5).all()
-    goals = db.query(FinancialGoal).filter(FinancialGoal.status == Status.active).all()
-    achievements = db.query(Achievement).order_by(Achievement.date_achieved.desc()).limit(4).all()
+    transactions = account_query(db, Transaction, account_id).order_by(Transaction.date.desc()).limit(5).all()
+    goals = account_query(db, FinancialGoal, account_id).filter(FinancialGoal.status == Status.active).all()
+    achievements = account_query(db, Achievement, account_id).order_by(Achievement.date_achieved.desc()).limit(4).all()
     
     # Get metrics
-    metrics = await get_financial_metrics(db)
+    metrics = get_financial_metrics(db, account_id)
     
     return {
         "transactions": transactions,
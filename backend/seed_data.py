@@ -1,19 +1,19 @@
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from database import DEFAULT_ACCOUNT_ID, router
 from main import Base, Transaction, FinancialGoal, Achievement, TransactionType, GoalCategory, Priority, Status
 
-def create_sample_data():
+def create_sample_data(account_id: str = DEFAULT_ACCOUNT_ID):
     """Create sample data for the financial dashboard"""
-    Base.metadata.create_all(bind=engine)
+    router.create_all(Base.metadata)
     
-    db = SessionLocal()
+    db = router.session_for(account_id)
     
     try:
         # Clear existing data
-        db.query(Transaction).delete()
-        db.query(FinancialGoal).delete()
-        db.query(Achievement).delete()
+        db.query(Transaction).filter(Transaction.account_id == account_id).delete()
+        db.query(FinancialGoal).filter(FinancialGoal.account_id == account_id).delete()
+        db.query(Achievement).filter(Achievement.account_id == account_id).delete()
         db.commit()
         
         # Sample Transactions
@@ -77,6 +77,7 @@ def create_sample_data():
         ]
         
         for transaction in transactions:
+            transaction.account_id = account_id
             db.add(transaction)
         
         # Sample Financial Goals
@@ -129,6 +130,7 @@ def create_sample_data():
         ]
         
         for goal in goals:
+            goal.account_id = account_id
             db.add(goal)
         
         # Sample Achievements
@@ -171,6 +173,7 @@ def create_sample_data():
         ]
         
         for achievement in achievements:
+            achievement.account_id = account_id
             db.add(achievement)
         
         db.commit()
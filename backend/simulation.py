@@ -0,0 +1,303 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+# Shard count is fixed (not tied to the host's core count) so that a given
+# seed produces identical results on every machine.
+SIMULATION_SHARDS = int(os.getenv("SIMULATION_SHARDS", "8"))
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", str(min(SIMULATION_SHARDS, os.cpu_count() or 1))))
+SIMULATION_TIMEOUT_SECONDS = float(os.getenv("SIMULATION_TIMEOUT_SECONDS", "1.0"))
+
+# Below this many paths the IPC overhead outweighs the parallel speedup
+INLINE_PATH_THRESHOLD = 20000
+
+DEFAULT_PATHS = 10000
+MAX_PATHS = 200000
+
+# Bounds on caller-supplied annual return and volatility; beyond these the
+# simulated balances overflow. Returns must stay above -100%.
+MAX_ANNUAL_RETURN = 1.0
+MAX_ANNUAL_VOLATILITY = 1.0
+
+# Longest horizon that can be simulated (50 years)
+MAX_MONTHS = int(os.getenv("SIMULATION_MAX_MONTHS", "600"))
+
+# Measured throughput of one worker, in path-months per second. Used to reject
+# requests that cannot finish within SIMULATION_TIMEOUT_SECONDS before any work starts.
+PATH_MONTHS_PER_SECOND = float(os.getenv("SIMULATION_PATH_MONTHS_PER_SECOND", "20000000"))
+
+DAYS_PER_MONTH = 30.44
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Annual (expected return, volatility) assumed for each goal category
+CATEGORY_RETURN_ASSUMPTIONS = {
+    "savings": (0.02, 0.005),
+    "investment": (0.07, 0.15),
+    "debt": (0.0, 0.0),
+    "income": (0.0, 0.0),
+}
+
+# Relative contribution volatility used when history is too short to estimate it
+DEFAULT_CONTRIBUTION_VOLATILITY = 0.25
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class SimulationTooLarge(ValueError):
+    """Raised when a simulation request exceeds the horizon or work limits"""
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared simulation process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        # Workers come from a clean forkserver process rather than being forked
+        # from the (multithreaded) server, which can deadlock them
+        _executor = ProcessPoolExecutor(
+            max_workers=SIMULATION_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _executor
+
+
+def _noop() -> None:
+    return None
+
+
+def warm_up_executor() -> None:
+    """Start every worker process so the first request doesn't pay for it"""
+    executor = get_executor()
+    for future in [executor.submit(_noop) for _ in range(SIMULATION_WORKERS)]:
+        future.result()
+
+
+def shutdown_executor() -> None:
+    """Shut down the shared simulation process pool"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def estimate_contribution_parameters(monthly_totals) -> tuple[float, float]:
+    """
+    Estimate the mean and standard deviation of monthly net cash flow
+    (income minus expenses) from (year, month, type, total) rows, as
+    aggregated from the transaction history by the database
+    """
+    monthly = {}
+    for year, month, type_, total in monthly_totals:
+        key = (int(year), int(month))
+        if type_ == "income":
+            monthly[key] = monthly.get(key, 0) + (total or 0)
+        elif type_ == "expense":
+            monthly[key] = monthly.get(key, 0) - (total or 0)
+        else:
+            monthly.setdefault(key, 0)
+
+    if not monthly:
+        return 0.0, 0.0
+
+    # Every calendar month from the first transaction to the last counts;
+    # months without transactions contribute a net flow of zero
+    (first_year, first_month), (last_year, last_month) = min(monthly), max(monthly)
+    first_index = first_year * 12 + first_month - 1
+    flows = np.zeros(last_year * 12 + last_month - first_index, dtype=np.float64)
+    for (year, month), flow in monthly.items():
+        flows[year * 12 + month - 1 - first_index] = flow
+    mean = float(flows.mean())
+    if len(flows) > 1:
+        std = float(flows.std(ddof=1))
+    else:
+        std = abs(mean) * DEFAULT_CONTRIBUTION_VOLATILITY
+    return mean, std
+
+
+def get_months_until_deadline(deadline: datetime, now: Optional[datetime] = None) -> int:
+    """Number of whole monthly contribution periods left before the deadline"""
+    now = now or datetime.utcnow()
+    days = (deadline - now).total_seconds() / 86400
+    return max(0, math.ceil(days / DAYS_PER_MONTH))
+
+
+def _simulate_shard(
+    seed: np.random.SeedSequence,
+    n_paths: int,
+    months: int,
+    start: float,
+    contribution_mean: float,
+    contribution_std: float,
+    annual_return: float,
+    annual_volatility: float,
+    deadline: float,
+) -> np.ndarray:
+    """
+    Simulate one shard of paths and return the terminal balances. Raises
+    TimeoutError once the wall-clock deadline passes, so a shard abandoned
+    by a timed-out request frees its worker instead of running to the end.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Monthly log-normal returns matching the annual expected return
+    sigma = annual_volatility / math.sqrt(12)
+    mu = math.log1p(annual_return) / 12 - 0.5 * sigma ** 2
+
+    balances = np.full(n_paths, start, dtype=np.float64)
+    growth = np.empty(n_paths, dtype=np.float64)
+    contributions = np.empty(n_paths, dtype=np.float64)
+    for _ in range(months):
+        if time.time() > deadline:
+            raise TimeoutError("Simulation shard exceeded its deadline")
+        rng.standard_normal(out=growth)
+        np.multiply(growth, sigma, out=growth)
+        np.add(growth, mu, out=growth)
+        np.exp(growth, out=growth)
+        rng.standard_normal(out=contributions)
+        np.multiply(contributions, contribution_std, out=contributions)
+        np.add(contributions, contribution_mean, out=contributions)
+        np.multiply(balances, growth, out=balances)
+        np.add(balances, contributions, out=balances)
+    return balances
+
+
+def _simulate_shards(shard_args: list[tuple]) -> list[np.ndarray]:
+    return [_simulate_shard(*args) for args in shard_args]
+
+
+def check_simulation_size(scenarios: list[dict], n_paths: int) -> None:
+    """
+    Reject requests whose horizon exceeds MAX_MONTHS or whose estimated
+    run time exceeds the latency budget
+    """
+    for scenario in scenarios:
+        if scenario["months"] > MAX_MONTHS:
+            raise SimulationTooLarge(
+                f"Goal {scenario['goal_id']} is {scenario['months']} months away; "
+                f"simulations are limited to {MAX_MONTHS} months"
+            )
+
+    path_months = n_paths * sum(scenario["months"] for scenario in scenarios)
+    workers = 1 if _runs_inline(scenarios, n_paths) else SIMULATION_WORKERS
+    estimated_seconds = path_months / (PATH_MONTHS_PER_SECOND * workers)
+    if estimated_seconds > SIMULATION_TIMEOUT_SECONDS:
+        raise SimulationTooLarge(
+            f"Simulation of {path_months} path-months would take about {estimated_seconds:.2f}s, "
+            f"over the {SIMULATION_TIMEOUT_SECONDS}s budget; reduce paths or goals"
+        )
+
+
+def _runs_inline(scenarios: list[dict], n_paths: int) -> bool:
+    return n_paths * len(scenarios) < INLINE_PATH_THRESHOLD
+
+
+def _shard_sizes(n_paths: int) -> list[int]:
+    base, extra = divmod(n_paths, SIMULATION_SHARDS)
+    return [base + (1 if i < extra else 0) for i in range(SIMULATION_SHARDS)]
+
+
+def build_goal_scenario(
+    goal,
+    contribution_mean: float,
+    contribution_std: float,
+    allocation: float = 1.0,
+    annual_return: Optional[float] = None,
+    annual_volatility: Optional[float] = None,
+) -> dict:
+    """
+    Turn a goal into simulation inputs. Debt goals are modelled as paying
+    down the gap between the current balance and the target, with no
+    market returns on the repayments.
+    """
+    category = getattr(goal.category, "value", goal.category)
+    default_return, default_volatility = CATEGORY_RETURN_ASSUMPTIONS.get(category, (0.0, 0.0))
+
+    if category == "debt":
+        start = 0.0
+        target = max(0.0, goal.current_amount - goal.target_amount)
+        default_return, default_volatility = 0.0, 0.0
+    else:
+        start = goal.current_amount
+        target = goal.target_amount
+
+    return {
+        "goal_id": goal.id,
+        "months": get_months_until_deadline(goal.deadline),
+        "start": float(start),
+        "target": float(target),
+        "contribution_mean": contribution_mean * allocation,
+        "contribution_std": contribution_std * allocation,
+        "annual_return": default_return if annual_return is None else annual_return,
+        "annual_volatility": default_volatility if annual_volatility is None else annual_volatility,
+    }
+
+
+def _summarize(scenario: dict, balances: np.ndarray, n_paths: int, seed: int) -> dict:
+    percentiles = np.percentile(balances, PERCENTILES)
+    return {
+        **scenario,
+        "paths": n_paths,
+        "seed": seed,
+        "attainment_probability": float(np.mean(balances >= scenario["target"])),
+        "expected_balance": float(balances.mean()),
+        "percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, percentiles)},
+    }
+
+
+async def simulate_goals(scenarios: list[dict], n_paths: int = DEFAULT_PATHS, seed: int = 0) -> list[dict]:
+    """
+    Run Monte Carlo paths for each scenario, sharded across the process
+    pool. Each goal's shard streams are spawned from (seed, goal_id), so a
+    goal's result depends only on the seed and path count, never on worker
+    scheduling or on which other goals are in the request.
+    Small runs go to a thread instead, since IPC would dominate.
+
+    Raises SimulationTooLarge before dispatching work that cannot fit the
+    budget, and TimeoutError when SIMULATION_TIMEOUT_SECONDS is exceeded.
+    """
+    check_simulation_size(scenarios, n_paths)
+
+    sizes = _shard_sizes(n_paths)
+    deadline = time.time() + SIMULATION_TIMEOUT_SECONDS
+
+    shard_args = []
+    for scenario in scenarios:
+        streams = np.random.SeedSequence([seed, scenario["goal_id"]]).spawn(len(sizes))
+        for stream, size in zip(streams, sizes):
+            args = (
+                stream,
+                size,
+                scenario["months"],
+                scenario["start"],
+                scenario["contribution_mean"],
+                scenario["contribution_std"],
+                scenario["annual_return"],
+                scenario["annual_volatility"],
+                deadline,
+            )
+            shard_args.append(args)
+
+    loop = asyncio.get_running_loop()
+    if _runs_inline(scenarios, n_paths):
+        pending = loop.run_in_executor(None, _simulate_shards, shard_args)
+    else:
+        executor = get_executor()
+        pending = asyncio.gather(*(loop.run_in_executor(executor, _simulate_shard, *args) for args in shard_args))
+
+    # On timeout, queued shards are cancelled and running ones stop at the deadline
+    try:
+        shard_results = await asyncio.wait_for(pending, SIMULATION_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise TimeoutError("Simulation exceeded its latency budget")
+
+    results = []
+    for i, scenario in enumerate(scenarios):
+        balances = np.concatenate(shard_results[i * len(sizes):(i + 1) * len(sizes)])
+        results.append(_summarize(scenario, balances, n_paths, seed))
+    return results
@@ -0,0 +1,145 @@
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import auth
+import main
+from database import AccountRouter
+
+
+@pytest.fixture
+def multi_tenant(monkeypatch):
+    monkeypatch.setattr(auth, "SINGLE_TENANT", False)
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret")
+    return TestClient(main.app)
+
+
+def bearer(account_id: str) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token(account_id)}"}
+
+
+def test_accounts_cannot_see_each_others_records(multi_tenant):
+    client = multi_tenant
+    alice, bob = bearer("alice"), bearer("bob")
+
+    goal = client.post("/api/goals", headers=alice, json={
+        "title": "Alice's goal",
+        "target_amount": 1000,
+        "deadline": (datetime.utcnow() + timedelta(days=365)).isoformat(),
+        "category": "savings",
+        "priority": "low",
+    }).json()
+    transaction = client.post("/api/transactions", headers=alice, json={
+        "description": "Alice's salary", "amount": 500, "category": "Salary", "type": "income",
+    }).json()
+    achievement = client.post("/api/achievements", headers=alice, json={
+        "title": "Alice's win", "description": "", "category": "Savings", "value": 1,
+    }).json()
+
+    for path in (f"/api/goals/{goal['id']}", f"/api/transactions/{transaction['id']}",
+                 f"/api/achievements/{achievement['id']}", f"/api/goals/{goal['id']}/simulate"):
+        assert client.get(path, headers=bob).status_code == 404
+    assert client.put(f"/api/goals/{goal['id']}", headers=bob, json={"title": "Mine now"}).status_code == 404
+    for path in (f"/api/goals/{goal['id']}", f"/api/transactions/{transaction['id']}",
+                 f"/api/achievements/{achievement['id']}"):
+        assert client.delete(path, headers=bob).status_code == 404
+    assert client.post("/api/goals/simulate", headers=bob, json={"goal_ids": [goal["id"]]}).status_code == 404
+
+    assert client.get("/api/goals", headers=bob).json() == []
+    assert client.get("/api/transactions", headers=bob).json() == []
+    assert client.get("/api/metrics", headers=bob).json()["monthly_income"] == 0
+
+    assert client.get(f"/api/goals/{goal['id']}", headers=alice).json()["title"] == "Alice's goal"
+    assert client.get("/api/metrics", headers=alice).json()["monthly_income"] == 500
+
+
+def test_multi_tenant_requests_need_a_valid_token(multi_tenant):
+    client = multi_tenant
+    expired = auth.create_access_token("alice", timedelta(seconds=-1))
+    wrong_key = jwt.encode({"sub": "alice"}, "other-secret", algorithm=auth.ALGORITHM)
+    no_subject = jwt.encode({"scope": "all"}, "test-secret", algorithm=auth.ALGORITHM)
+
+    for headers in (
+        {},
+        {"X-Account-ID": "alice"},
+        {"Authorization": "Bearer not-a-token"},
+        {"Authorization": f"Basic {expired}"},
+        {"Authorization": f"Bearer {expired}"},
+        {"Authorization": f"Bearer {wrong_key}"},
+        {"Authorization": f"Bearer {no_subject}"},
+    ):
+        response = client.get("/api/goals", headers=headers)
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    assert client.get("/api/health").status_code == 200
+
+
+def sqlite_url(tmp_path, name: str) -> str:
+    return f"sqlite:///{tmp_path / name}"
+
+
+def account_hashing_to(**placements: int) -> str:
+    """An account id whose crc32 lands on the given shard for each shard count, e.g. of_2=1"""
+    return next(
+        f"acct-{i}" for i in range(1000)
+        if all(zlib.crc32(f"acct-{i}".encode()) % int(key[3:]) == shard for key, shard in placements.items())
+    )
+
+
+def open_router(tmp_path, *shards: str) -> AccountRouter:
+    router = AccountRouter([sqlite_url(tmp_path, name) for name in shards], primary_url=sqlite_url(tmp_path, "primary.db"))
+    router.create_all(main.Base.metadata)
+    return router
+
+
+def test_placement_survives_restart_and_appended_shards(tmp_path):
+    router = open_router(tmp_path, "s1.db")
+    account = account_hashing_to(of_2=1, of_3=2)
+    assert router.shards.index(router.shard_for(account)) == 1
+
+    reopened = open_router(tmp_path, "s1.db")
+    assert reopened.shards.index(reopened.shard_for(account)) == 1
+
+    # With three shards the hash would now pick a different shard, but the directory wins
+    grown = open_router(tmp_path, "s1.db", "s2.db")
+    assert grown.shards.index(grown.shard_for(account)) == 1
+
+
+@pytest.mark.parametrize("shards", [("s2.db", "s1.db"), ("s1.db",), ()])
+def test_reordered_or_removed_shards_refuse_to_start(tmp_path, shards):
+    open_router(tmp_path, "s1.db", "s2.db")
+    with pytest.raises(RuntimeError, match="Shards may only be appended"):
+        open_router(tmp_path, *shards)
+
+
+def add_transaction(router: AccountRouter, shard: int, account_id: str):
+    db = router.shards[shard].SessionLocal()
+    try:
+        db.add(main.Transaction(account_id=account_id, description="Existing", amount=1,
+                                category="Test", type=main.TransactionType.income))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_existing_rows_are_registered_where_they_live(tmp_path):
+    # Data written before sharding was enabled stays reachable on shard 0
+    account = account_hashing_to(of_2=1)
+    add_transaction(open_router(tmp_path), 0, account)
+
+    router = open_router(tmp_path, "s1.db")
+    assert router.shards.index(router.shard_for(account)) == 0
+
+
+def test_rows_on_a_shard_the_directory_disagrees_with_refuse_to_start(tmp_path):
+    router = open_router(tmp_path, "s1.db")
+    account = account_hashing_to(of_2=1)
+    assert router.shards.index(router.shard_for(account)) == 1
+    add_transaction(router, 0, account)
+
+    with pytest.raises(RuntimeError, match="directory places it on shard 1"):
+        open_router(tmp_path, "s1.db")
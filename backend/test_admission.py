@@ -0,0 +1,78 @@
+import asyncio
+
+from fastapi import HTTPException
+
+import admission
+from admission import HEAVY, RouteLimiter
+
+
+def make_limiter() -> RouteLimiter:
+    limiter = RouteLimiter("GET /test", HEAVY)
+    limiter.max_concurrent, limiter.max_queue, limiter.max_wait = 2, 8, 0.05
+    return limiter
+
+
+def status_of(result) -> int:
+    return result.status_code if isinstance(result, HTTPException) else 200
+
+
+def test_burst_in_one_tick_respects_queue_bound():
+    async def burst():
+        limiter = make_limiter()
+        results = await asyncio.gather(*(limiter.acquire() for _ in range(14)), return_exceptions=True)
+        return limiter, [status_of(result) for result in results]
+
+    limiter, statuses = asyncio.run(burst())
+
+    # 2 run, 8 queue (and time out since nothing is released), 4 are shed immediately
+    assert statuses.count(200) == 2
+    assert statuses.count(503) == 8
+    assert statuses.count(429) == 4
+    assert limiter.rejected_queue_full == 4
+    assert limiter.in_flight == 2
+    assert limiter.waiting == 0
+
+
+def test_queued_requests_are_admitted_on_release():
+    async def run():
+        limiter = make_limiter()
+        limiter.max_wait = 1.0
+        first = await limiter.acquire()
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+
+        limiter.release(first)
+        await queued
+        return limiter
+
+    limiter = asyncio.run(run())
+
+    assert limiter.admitted == 3
+    assert limiter.active == 2
+    assert limiter.waiting == 0
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_class_limit_is_shared_across_heavy_routes(monkeypatch):
+    class_limiter = RouteLimiter("all heavy routes", HEAVY, (1, 0, 0.05))
+    monkeypatch.setitem(admission._class_limiters, HEAVY, class_limiter)
+    metrics = admission.limit("GET /test/metrics", HEAVY)
+    dashboard = admission.limit("GET /test/dashboard", HEAVY)
+
+    async def run():
+        running = metrics()
+        await running.__anext__()
+        blocked = dashboard()
+        try:
+            await blocked.__anext__()
+        except HTTPException as e:
+            status = e.status_code
+        await running.aclose()
+        return status
+
+    # The dashboard route has free per-route slots but the class is full
+    assert asyncio.run(run()) == 429
+    assert class_limiter.rejected_queue_full == 1
+    assert class_limiter.in_flight == 0
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import simulation
+
+
+def scenario(goal_id: int, months: int = 24) -> dict:
+    return {
+        "goal_id": goal_id,
+        "months": months,
+        "start": 1000.0,
+        "target": 20000.0,
+        "contribution_mean": 800.0,
+        "contribution_std": 300.0,
+        "annual_return": 0.07,
+        "annual_volatility": 0.15,
+    }
+
+
+def run(scenarios, n_paths=5000, seed=0):
+    return asyncio.run(simulation.simulate_goals(scenarios, n_paths, seed))
+
+
+def test_contributions_count_months_without_transactions_as_zero():
+    # Nov and Feb have flows; Dec and Jan are empty and must count as zero
+    mean, std = simulation.estimate_contribution_parameters([
+        (2024, 11, "income", 1000),
+        (2025, 2, "income", 1000),
+        (2025, 2, "expense", 200),
+        (2025, 2, "investment", 500),
+    ])
+    assert mean == pytest.approx(450.0)
+    assert std == pytest.approx(525.99, abs=0.01)
+
+
+def test_contributions_with_short_or_empty_history():
+    mean, std = simulation.estimate_contribution_parameters([(2025, 2, "income", 1000)])
+    assert mean == 1000.0
+    assert std == 1000.0 * simulation.DEFAULT_CONTRIBUTION_VOLATILITY
+    assert simulation.estimate_contribution_parameters([]) == (0.0, 0.0)
+
+
+def test_same_seed_reproduces_results():
+    assert run([scenario(1)], seed=7) == run([scenario(1)], seed=7)
+    assert run([scenario(1)], seed=7) != run([scenario(1)], seed=8)
+
+
+def test_goal_result_does_not_depend_on_other_goals_in_request():
+    alone = run([scenario(3)], seed=7)[0]
+    together = run([scenario(1), scenario(3)], seed=7)
+    assert [result["goal_id"] for result in together] == [1, 3]
+    assert together[1] == alone
+
+
+def test_process_pool_matches_inline_results(monkeypatch):
+    inline = run([scenario(1)], seed=3)
+    monkeypatch.setattr(simulation, "INLINE_PATH_THRESHOLD", 0)
+    try:
+        pooled = run([scenario(1)], seed=3)
+    finally:
+        simulation.shutdown_executor()
+    assert pooled == inline
+
+
+def test_horizon_beyond_limit_is_rejected():
+    with pytest.raises(simulation.SimulationTooLarge, match="months"):
+        simulation.check_simulation_size([scenario(1, months=simulation.MAX_MONTHS + 1)], 1000)
+
+
+def test_work_beyond_latency_budget_is_rejected(monkeypatch):
+    monkeypatch.setattr(simulation, "PATH_MONTHS_PER_SECOND", 1000)
+    with pytest.raises(simulation.SimulationTooLarge, match="budget"):
+        simulation.check_simulation_size([scenario(1)], 1000)
+
+
+def test_simulation_over_budget_times_out(monkeypatch):
+    monkeypatch.setattr(simulation, "PATH_MONTHS_PER_SECOND", 1e15)
+    monkeypatch.setattr(simulation, "SIMULATION_TIMEOUT_SECONDS", 0.01)
+    with pytest.raises(TimeoutError):
+        run([scenario(1, months=simulation.MAX_MONTHS)], n_paths=19000)
+
+
+def test_simulate_endpoint_maps_limits_to_http_errors(monkeypatch):
+    import main
+
+    client = TestClient(main.app)
+    goal = client.post("/api/goals", json={
+        "title": "Simulated",
+        "target_amount": 10000,
+        "deadline": (datetime.utcnow() + timedelta(days=365)).isoformat(),
+        "category": "savings",
+        "priority": "low",
+    }).json()
+    url = f"/api/goals/{goal['id']}/simulate"
+
+    assert client.get(url, params={"paths": 1000}).status_code == 200
+    assert client.get(url, params={"seed": -1}).status_code == 422
+    assert client.get(url, params={"annual_return": -1}).status_code == 422
+
+    monkeypatch.setattr(simulation, "MAX_MONTHS", 6)
+    assert client.get(url).status_code == 422
+
+    monkeypatch.setattr(simulation, "MAX_MONTHS", 600)
+    monkeypatch.setattr(simulation, "PATH_MONTHS_PER_SECOND", 1e15)
+    monkeypatch.setattr(simulation, "SIMULATION_TIMEOUT_SECONDS", 0.0001)
+    response = client.get(url, params={"paths": 19000})
+    assert response.status_code == 503